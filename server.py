@@ -4,18 +4,37 @@ Claude-Gemini MCP Server
 Enables Claude Code to collaborate with Google's Gemini AI
 """
 
+import asyncio
 import json
 import sys
 import os
-from typing import Dict, Any, Optional
+import select
+import stat
+import time
+import hashlib
+import fastjsonschema
+import orjson
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
 
-# Ensure unbuffered output
-sys.stdout = os.fdopen(sys.stdout.fileno(), 'w', 1)
+# Ensure unbuffered output; responses bypass sys.stdout and go straight to the fd
 sys.stderr = os.fdopen(sys.stderr.fileno(), 'w', 1)
+_STDOUT_FD = sys.stdout.fileno()
 
 # Server version
 __version__ = "1.0.0"
 
+# Gemini model used for all tool calls
+MODEL_NAME = "gemini-2.0-flash"
+
+# Response cache: identical requests within the TTL reuse the earlier answer
+CACHE_TTL_SECONDS = 3600
+CACHE_MAX_ENTRIES = 256
+_response_cache: "OrderedDict[bytes, Tuple[float, str]]" = OrderedDict()
+
+# Largest JSON-RPC message accepted on stdin (code reviews can be big)
+STDIN_LINE_LIMIT = 64 * 1024 * 1024
+
 # Initialize Gemini
 try:
     import google.generativeai as genai
@@ -32,164 +51,223 @@ try:
         }), file=sys.stdout, flush=True)
         sys.exit(1)
     
-    genai.configure(api_key=API_KEY)
-    model = genai.GenerativeModel('gemini-2.0-flash')
+    # All calls are async, so pin the gRPC asyncio transport: one HTTP/2
+    # channel is opened on first use and shared by every request
+    genai.configure(api_key=API_KEY, transport="grpc_asyncio")
+    model = genai.GenerativeModel(MODEL_NAME)
     GEMINI_AVAILABLE = True
 except Exception as e:
     GEMINI_AVAILABLE = False
     GEMINI_ERROR = str(e)
 
-def send_response(response: Dict[str, Any]):
+def send_response(response: Union[Dict[str, Any], List[Dict[str, Any]]]):
     """Send a JSON-RPC response"""
-    print(json.dumps(response), flush=True)
+    data = memoryview(orjson.dumps(response) + b"\n")
+    while data:
+        try:
+            written = os.write(_STDOUT_FD, data)
+        except BlockingIOError:
+            # stdout may share a non-blocking fd with stdin; never leave a
+            # frame half-written, wait until it drains and carry on
+            select.select([], [_STDOUT_FD], [])
+            continue
+        data = data[written:]
+
+# Static results, built once at import and reused for every request
+INITIALIZE_RESULT = {
+    "protocolVersion": "2024-11-05",
+    "capabilities": {
+        "tools": {}
+    },
+    "serverInfo": {
+        "name": "claude-gemini-mcp",
+        "version": __version__
+    }
+}
+
+GEMINI_TOOLS = [
+    {
+        "name": "ask_gemini",
+        "description": "Ask Gemini a question and get the response directly in Claude's context",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "prompt": {
+                    "type": "string",
+                    "description": "The question or prompt for Gemini"
+                },
+                "temperature": {
+                    "type": "number",
+                    "description": "Temperature for response (0.0-1.0)",
+                    "default": 0.5
+                },
+                "cache": {
+                    "type": "boolean",
+                    "description": "Reuse a cached response for an identical request",
+                    "default": True
+                }
+            },
+            "required": ["prompt"]
+        }
+    },
+    {
+        "name": "gemini_code_review",
+        "description": "Have Gemini review code and return feedback directly to Claude",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "code": {
+                    "type": "string",
+                    "description": "The code to review"
+                },
+                "focus": {
+                    "type": "string",
+                    "description": "Specific focus area (security, performance, etc.)",
+                    "default": "general"
+                },
+                "cache": {
+                    "type": "boolean",
+                    "description": "Reuse a cached response for an identical request",
+                    "default": True
+                }
+            },
+            "required": ["code"]
+        }
+    },
+    {
+        "name": "gemini_brainstorm",
+        "description": "Brainstorm solutions with Gemini, response visible to Claude",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "topic": {
+                    "type": "string",
+                    "description": "The topic to brainstorm about"
+                },
+                "context": {
+                    "type": "string",
+                    "description": "Additional context",
+                    "default": ""
+                },
+                "cache": {
+                    "type": "boolean",
+                    "description": "Reuse a cached response for an identical request",
+                    "default": True
+                }
+            },
+            "required": ["topic"]
+        }
+    }
+]
+
+STATUS_TOOLS = [
+    {
+        "name": "server_info",
+        "description": "Get server status and error information",
+        "inputSchema": {
+            "type": "object",
+            "properties": {}
+        }
+    }
+]
+
+TOOLS_LIST_RESULT = {
+    "tools": GEMINI_TOOLS if GEMINI_AVAILABLE else STATUS_TOOLS
+}
+
+# Argument validators compiled from the inputSchema of each advertised tool
+TOOL_VALIDATORS = {
+    tool["name"]: fastjsonschema.compile(tool["inputSchema"])
+    for tool in TOOLS_LIST_RESULT["tools"]
+}
 
 def handle_initialize(request_id: Any) -> Dict[str, Any]:
     """Handle initialization"""
     return {
         "jsonrpc": "2.0",
         "id": request_id,
-        "result": {
-            "protocolVersion": "2024-11-05",
-            "capabilities": {
-                "tools": {}
-            },
-            "serverInfo": {
-                "name": "claude-gemini-mcp",
-                "version": __version__
-            }
-        }
+        "result": INITIALIZE_RESULT
     }
 
 def handle_tools_list(request_id: Any) -> Dict[str, Any]:
     """List available tools"""
-    tools = []
-    
-    if GEMINI_AVAILABLE:
-        tools = [
-            {
-                "name": "ask_gemini",
-                "description": "Ask Gemini a question and get the response directly in Claude's context",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "prompt": {
-                            "type": "string",
-                            "description": "The question or prompt for Gemini"
-                        },
-                        "temperature": {
-                            "type": "number",
-                            "description": "Temperature for response (0.0-1.0)",
-                            "default": 0.5
-                        }
-                    },
-                    "required": ["prompt"]
-                }
-            },
-            {
-                "name": "gemini_code_review",
-                "description": "Have Gemini review code and return feedback directly to Claude",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "code": {
-                            "type": "string",
-                            "description": "The code to review"
-                        },
-                        "focus": {
-                            "type": "string",
-                            "description": "Specific focus area (security, performance, etc.)",
-                            "default": "general"
-                        }
-                    },
-                    "required": ["code"]
-                }
-            },
-            {
-                "name": "gemini_brainstorm",
-                "description": "Brainstorm solutions with Gemini, response visible to Claude",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "topic": {
-                            "type": "string",
-                            "description": "The topic to brainstorm about"
-                        },
-                        "context": {
-                            "type": "string",
-                            "description": "Additional context",
-                            "default": ""
-                        }
-                    },
-                    "required": ["topic"]
-                }
-            }
-        ]
-    else:
-        tools = [
-            {
-                "name": "server_info",
-                "description": "Get server status and error information",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {}
-                }
-            }
-        ]
-    
     return {
         "jsonrpc": "2.0",
         "id": request_id,
-        "result": {
-            "tools": tools
-        }
+        "result": TOOLS_LIST_RESULT
     }
 
-def call_gemini(prompt: str, temperature: float = 0.5) -> str:
-    """Call Gemini and return response"""
+def _cache_key(prompt: str, temperature: float) -> bytes:
+    """Build the response cache key for a prompt"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(MODEL_NAME.encode())
+    h.update(b"\0")
+    h.update(str(round(temperature, 1)).encode())
+    h.update(b"\0")
+    h.update(prompt.encode())
+    return h.digest()
+
+def _cache_get(key: bytes) -> Optional[str]:
+    """Return a cached response if it has not expired"""
+    entry = _response_cache.get(key)
+    if entry is None:
+        return None
+    stored_at, text = entry
+    if time.monotonic() - stored_at > CACHE_TTL_SECONDS:
+        del _response_cache[key]
+        return None
+    _response_cache.move_to_end(key)
+    return text
+
+def _cache_put(key: bytes, text: str):
+    """Store a response, evicting the least recently used entry when full"""
+    _response_cache[key] = (time.monotonic(), text)
+    _response_cache.move_to_end(key)
+    if len(_response_cache) > CACHE_MAX_ENTRIES:
+        _response_cache.popitem(last=False)
+
+# Receives each chunk of streamed Gemini text
+ProgressCallback = Optional[Callable[[str], None]]
+
+async def call_gemini(prompt: str, temperature: float = 0.5, use_cache: bool = True,
+                      on_chunk: ProgressCallback = None) -> str:
+    """Call Gemini and return response
+    
+    When on_chunk is given the response is streamed and each piece of
+    text is passed to it as it arrives.
+    """
+    key = _cache_key(prompt, temperature)
+    if use_cache:
+        cached = _cache_get(key)
+        if cached is not None:
+            return cached
+    
     try:
-        response = model.generate_content(
+        response = await model.generate_content_async(
             prompt,
             generation_config=genai.GenerationConfig(
                 temperature=temperature,
                 max_output_tokens=8192,
-            )
+            ),
+            stream=on_chunk is not None
         )
-        return response.text
+        if on_chunk is not None:
+            async for chunk in response:
+                # Usage-only chunks have no candidates (and .parts raises on
+                # them); finish-reason chunks have a candidate but no parts
+                if chunk.candidates and chunk.parts:
+                    on_chunk(chunk.text)
+        text = response.text
     except Exception as e:
         return f"Error calling Gemini: {str(e)}"
-
-def handle_tool_call(request_id: Any, params: Dict[str, Any]) -> Dict[str, Any]:
-    """Handle tool execution"""
-    tool_name = params.get("name")
-    arguments = params.get("arguments", {})
     
-    try:
-        result = ""
-        
-        if tool_name == "server_info":
-            if GEMINI_AVAILABLE:
-                result = f"Server v{__version__} - Gemini connected and ready!"
-            else:
-                result = f"Server v{__version__} - Gemini error: {GEMINI_ERROR}"
-        
-        elif tool_name == "ask_gemini":
-            if not GEMINI_AVAILABLE:
-                result = f"Gemini not available: {GEMINI_ERROR}"
-            else:
-                prompt = arguments.get("prompt", "")
-                temperature = arguments.get("temperature", 0.5)
-                result = call_gemini(prompt, temperature)
-            
-        elif tool_name == "gemini_code_review":
-            if not GEMINI_AVAILABLE:
-                result = f"Gemini not available: {GEMINI_ERROR}"
-            else:
-                code = arguments.get("code", "")
-                focus = arguments.get("focus", "general")
-                prompt = f"""Please review this code with a focus on {focus}:
+    _cache_put(key, text)
+    return text
 
-```
-{code}
+# Constant prompt scaffolding around the user's input
+REVIEW_HEAD = "Please review this code with a focus on "
+REVIEW_CODE_OPEN = ":\n\n```\n"
+REVIEW_FOOT = """
 ```
 
 Provide specific, actionable feedback on:
@@ -198,23 +276,116 @@ Provide specific, actionable feedback on:
 3. Performance optimizations
 4. Best practices
 5. Code clarity and maintainability"""
-                result = call_gemini(prompt, 0.2)
-            
-        elif tool_name == "gemini_brainstorm":
-            if not GEMINI_AVAILABLE:
-                result = f"Gemini not available: {GEMINI_ERROR}"
-            else:
-                topic = arguments.get("topic", "")
-                context = arguments.get("context", "")
-                prompt = f"Let's brainstorm about: {topic}"
-                if context:
-                    prompt += f"\n\nContext: {context}"
-                prompt += "\n\nProvide creative ideas, alternatives, and considerations."
-                result = call_gemini(prompt, 0.7)
-            
-        else:
+
+BRAINSTORM_HEAD = "Let's brainstorm about: "
+BRAINSTORM_CONTEXT = "\n\nContext: "
+BRAINSTORM_FOOT = "\n\nProvide creative ideas, alternatives, and considerations."
+
+def progress_reporter(params: Dict[str, Any]) -> ProgressCallback:
+    """Return a callback sending progress notifications, if the client asked for them"""
+    token = (params.get("_meta") or {}).get("progressToken")
+    if token is None:
+        return None
+    
+    count = 0
+    
+    def report(text: str):
+        nonlocal count
+        count += 1
+        send_response({
+            "jsonrpc": "2.0",
+            "method": "notifications/progress",
+            "params": {
+                "progressToken": token,
+                "progress": count,
+                "message": text
+            }
+        })
+    
+    return report
+
+async def tool_server_info(arguments: Dict[str, Any], progress: ProgressCallback) -> str:
+    """Report server version and Gemini status"""
+    return SERVER_STATUS
+
+async def tool_ask_gemini(arguments: Dict[str, Any], progress: ProgressCallback) -> str:
+    """Ask Gemini a free-form question"""
+    prompt = arguments.get("prompt", "")
+    temperature = arguments.get("temperature", 0.5)
+    use_cache = arguments.get("cache", True)
+    return await call_gemini(prompt, temperature, use_cache, progress)
+
+async def tool_code_review(arguments: Dict[str, Any], progress: ProgressCallback) -> str:
+    """Have Gemini review a piece of code"""
+    code = arguments.get("code", "")
+    focus = arguments.get("focus", "general")
+    prompt = REVIEW_HEAD + focus + REVIEW_CODE_OPEN + code + REVIEW_FOOT
+    use_cache = arguments.get("cache", True)
+    return await call_gemini(prompt, 0.2, use_cache, progress)
+
+async def tool_brainstorm(arguments: Dict[str, Any], progress: ProgressCallback) -> str:
+    """Brainstorm a topic with Gemini"""
+    topic = arguments.get("topic", "")
+    context = arguments.get("context", "")
+    if context:
+        prompt = BRAINSTORM_HEAD + topic + BRAINSTORM_CONTEXT + context + BRAINSTORM_FOOT
+    else:
+        prompt = BRAINSTORM_HEAD + topic + BRAINSTORM_FOOT
+    use_cache = arguments.get("cache", True)
+    return await call_gemini(prompt, 0.7, use_cache, progress)
+
+async def tool_unavailable(arguments: Dict[str, Any], progress: ProgressCallback) -> str:
+    """Stand-in for the Gemini tools when Gemini failed to initialize"""
+    return GEMINI_UNAVAILABLE
+
+# GEMINI_AVAILABLE is fixed at import, so pick the handler table once
+if GEMINI_AVAILABLE:
+    SERVER_STATUS = f"Server v{__version__} - Gemini connected and ready!"
+    TOOL_HANDLERS = {
+        "server_info": tool_server_info,
+        "ask_gemini": tool_ask_gemini,
+        "gemini_code_review": tool_code_review,
+        "gemini_brainstorm": tool_brainstorm,
+    }
+else:
+    SERVER_STATUS = f"Server v{__version__} - Gemini error: {GEMINI_ERROR}"
+    GEMINI_UNAVAILABLE = f"Gemini not available: {GEMINI_ERROR}"
+    TOOL_HANDLERS = {
+        "server_info": tool_server_info,
+        "ask_gemini": tool_unavailable,
+        "gemini_code_review": tool_unavailable,
+        "gemini_brainstorm": tool_unavailable,
+    }
+
+async def handle_tool_call(request_id: Any, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Handle tool execution"""
+    tool_name = params.get("name")
+    arguments = params.get("arguments", {})
+    progress = progress_reporter(params)
+    
+    try:
+        handler = TOOL_HANDLERS.get(tool_name) if isinstance(tool_name, str) else None
+        if handler is None:
             raise ValueError(f"Unknown tool: {tool_name}")
         
+        # Tools not advertised in tools/list (the Gemini tools while Gemini
+        # is unavailable) have no schema to check against
+        validate = TOOL_VALIDATORS.get(tool_name)
+        try:
+            if validate is not None:
+                arguments = validate(arguments)
+        except fastjsonschema.JsonSchemaException as e:
+            return {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "error": {
+                    "code": -32602,
+                    "message": f"Invalid params: {e.message}"
+                }
+            }
+        
+        result = await handler(arguments, progress)
+        
         return {
             "jsonrpc": "2.0",
             "id": request_id,
@@ -237,51 +408,136 @@ Provide specific, actionable feedback on:
             }
         }
 
-def main():
-    """Main server loop"""
-    while True:
-        try:
-            line = sys.stdin.readline()
-            if not line:
-                break
-            
-            request = json.loads(line.strip())
-            method = request.get("method")
-            request_id = request.get("id")
-            params = request.get("params", {})
-            
-            if method == "initialize":
-                response = handle_initialize(request_id)
-            elif method == "tools/list":
-                response = handle_tools_list(request_id)
-            elif method == "tools/call":
-                response = handle_tool_call(request_id, params)
-            else:
-                response = {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32601,
-                        "message": f"Method not found: {method}"
-                    }
+def invalid_request(request_id: Any = None) -> Dict[str, Any]:
+    """Build the error response for a malformed JSON-RPC request"""
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {
+            "code": -32600,
+            "message": "Invalid Request"
+        }
+    }
+
+async def dispatch(request: Any) -> Dict[str, Any]:
+    """Route a single JSON-RPC request to its handler"""
+    if not isinstance(request, dict):
+        return invalid_request()
+    
+    request_id = request.get("id")
+    method = request.get("method")
+    params = request.get("params", {})
+    
+    try:
+        if method == "initialize":
+            return handle_initialize(request_id)
+        elif method == "tools/list":
+            return handle_tools_list(request_id)
+        elif method == "tools/call":
+            return await handle_tool_call(request_id, params)
+        else:
+            return {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "error": {
+                    "code": -32601,
+                    "message": f"Method not found: {method}"
                 }
+            }
+    except Exception as e:
+        return {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "error": {
+                "code": -32603,
+                "message": f"Internal error: {str(e)}"
+            }
+        }
+
+async def handle_request(line: bytes):
+    """Handle one line from stdin, either a single request or a batch"""
+    try:
+        request = orjson.loads(line)
+    except orjson.JSONDecodeError:
+        return
+    
+    try:
+        if isinstance(request, list):
+            if not request:
+                send_response(invalid_request())
+                return
             
+            # Run the batch concurrently; notifications get no entry in the reply
+            results = await asyncio.gather(*(dispatch(r) for r in request))
+            responses = [
+                response for r, response in zip(request, results)
+                if not isinstance(r, dict) or "id" in r
+            ]
+            if responses:
+                send_response(responses)
+            return
+        
+        response = await dispatch(request)
+        # Notifications get no reply
+        if not isinstance(request, dict) or "id" in request:
             send_response(response)
-            
-        except json.JSONDecodeError:
+    except OSError as e:
+        # The client went away or stdout is unwritable; nothing to reply to
+        print(f"Failed to send response: {e}", file=sys.stderr)
+
+async def read_lines():
+    """Yield JSON-RPC lines from stdin until EOF
+    
+    Pipes and sockets are read through an asyncio StreamReader; anything
+    else (a redirected file, a terminal) is read line by line in a
+    worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    mode = os.fstat(sys.stdin.fileno()).st_mode
+    
+    if not (stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode)):
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.buffer.readline)
+            if not line:
+                return
+            yield line
+    
+    reader = asyncio.StreamReader(limit=STDIN_LINE_LIMIT)
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), sys.stdin
+    )
+    while True:
+        try:
+            line = await reader.readline()
+        except (ValueError, asyncio.LimitOverrunError):
+            print(f"Skipping message longer than {STDIN_LINE_LIMIT} bytes",
+                  file=sys.stderr)
             continue
-        except EOFError:
-            break
-        except Exception as e:
-            if 'request_id' in locals():
-                send_response({
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32603,
-                        "message": f"Internal error: {str(e)}"
-                    }
-                })
+        if not line:
+            return
+        yield line
+
+async def main_async():
+    """Main server loop
+    
+    Each message is handled in its own task, so a slow Gemini call does
+    not hold up the requests behind it.
+    """
+    pending = set()
+    async for line in read_lines():
+        if not line.strip():
+            continue
+        task = asyncio.create_task(handle_request(line))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    
+    # Finish in-flight requests before exiting on EOF
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+def main():
+    """Run the server until stdin is closed"""
+    asyncio.run(main_async())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -56,7 +56,7 @@ rm ~/.claude-mcp-servers/gemini-collab/server.py.bak
 # Install Python dependencies
 echo ""
 echo "📦 Installing Python dependencies..."
-pip3 install google-generativeai --quiet
+pip3 install google-generativeai orjson fastjsonschema --quiet
 
 # Remove any existing MCP configuration
 echo ""